@@ -84,3 +84,250 @@ Content-Type: text/html\r
     async with async_asgi_testclient.TestClient(app) as client:
         resp = await client.post('/', headers={'Content-Type': 'multipart/form-data; boundary=9051914041544843365972754266'}, data=payload)
         assert resp.status_code == 200
+
+
+async def test_routing(app):
+    @app.get(r'/users/(?P<id>\d+)')
+    def user(request):
+        return {'request.params': request.params}
+
+    @app.route(r'/posts/(?P<id>\d+)(?:/(?P<slug>[a-z-]+))?', methods=('GET', 'PUT'))
+    def post(request):
+        return {'request.params': request.params}
+
+    async with async_asgi_testclient.TestClient(app) as client:
+        resp = await client.get('/users/42')
+        assert resp.status_code == 200
+        assert json.loads(resp.content) == {'request.params': {'id': '42'}}
+        resp = await client.get('/posts/7/hello-world')
+        assert json.loads(resp.content) == {'request.params': {'id': '7', 'slug': 'hello-world'}}
+        resp = await client.post('/posts/7')
+        assert resp.status_code == 405
+        assert resp.headers['allow'] == 'GET, PUT'
+        resp = await client.get('/users/abc')
+        assert resp.status_code == 404
+        assert app._router is not None
+
+
+async def test_routing_fallback(app):
+    @app.get('(?i)/a')
+    def a(request):
+        return 'a'
+
+    @app.get('/b/(.)/\\1')
+    def b(request):
+        return 'b'
+
+    @app.get('/c')
+    def c(request):
+        return 'c'
+
+    async with async_asgi_testclient.TestClient(app) as client:
+        assert app._router is None
+        resp = await client.get('/A')
+        assert resp.content == b'a'
+        resp = await client.get('/b/x/x')
+        assert resp.content == b'b'
+        resp = await client.get('/C')
+        assert resp.status_code == 404
+
+
+async def test_response_headers(app):
+    @app.get('/')
+    def root(request):
+        return 'Hello, world!'
+
+    @app.get('/json')
+    def json_(request):
+        return uhttp.Response(200, headers={'Content-Type': 'application/json', 'Content-Length': '0'}, body=b'{}')
+
+    async with async_asgi_testclient.TestClient(app) as client:
+        resp = await client.get('/')
+        assert resp.headers['content-type'] == 'text/html; charset=utf-8'
+        assert resp.headers['content-length'] == '13'
+        resp = await client.get('/json')
+        assert resp.headers['content-type'] == 'application/json'
+        assert resp.headers['content-length'] == '2'
+
+
+async def test_args(app):
+    @app.get('/')
+    def root(request):
+        assert request.args == {'a': ['b&c', '2'], 'empty': ['']}
+        return {'request.args': request.args}
+
+    async with async_asgi_testclient.TestClient(app) as client:
+        resp = await client.get('/', query_string=[('a', 'b&c'), ('a', '2'), ('empty', '')])
+        assert resp.status_code == 200
+        assert json.loads(resp.content) == {'request.args': {'a': '2', 'empty': ''}}
+
+
+async def test_max_content():
+    app = uhttp.App(max_content=16)
+
+    @app.post('/')
+    def root(request):
+        return ''
+
+    async with async_asgi_testclient.TestClient(app) as client:
+        resp = await client.post('/', headers={'Content-Type': 'application/json'}, data=json.dumps(['a'] * 10))
+        assert resp.status_code == 413
+        resp = await client.post('/', headers={'Content-Type': 'application/x-www-form-urlencoded'}, data='a=' + 'b' * 16)
+        assert resp.status_code == 413
+
+
+async def test_cookies(app):
+    @app.get('/')
+    def root(request):
+        response = uhttp.Response(200)
+        response.cookies['seen'] = request.cookies['visits'].value
+        return response
+
+    async with async_asgi_testclient.TestClient(app) as client:
+        resp = await client.get('/', headers={'Cookie': 'visits=3; theme=dark'})
+        assert resp.status_code == 200
+        assert resp.headers['set-cookie'] == 'seen=3'
+
+
+async def test_form_multipart_formdata_errors(app):
+    @app.post('/')
+    def root(request):
+        return ''
+
+    async with async_asgi_testclient.TestClient(app) as client:
+        resp = await client.post('/', headers={'Content-Type': 'multipart/form-data'}, data=b'--x--')
+        assert resp.status_code == 400
+        resp = await client.post('/', headers={'Content-Type': 'multipart/form-data; boundary=x'}, data=b'--x\r\nContent-Disposition: form-data; name="a"\r\n\r\nb')
+        assert resp.status_code == 400
+
+
+async def test_response_headers_not_shared(app):
+    cors = uhttp.Headers({'access-control-allow-origin': '*'})
+
+    @app.get('/')
+    def root(request):
+        response = uhttp.Response(200, headers=cors)
+        if 'user' in request.args:
+            response.cookies['session'] = request.args['user']
+        return response
+
+    async with async_asgi_testclient.TestClient(app) as client:
+        resp = await client.get('/', query_string={'user': 'bob'})
+        assert resp.headers['set-cookie'] == 'session=bob'
+        resp = await client.get('/')
+        assert 'set-cookie' not in resp.headers
+        assert resp.headers['access-control-allow-origin'] == '*'
+    assert dict(cors._items()) == {'access-control-allow-origin': ['*']}
+
+
+async def test_multidict_lists_are_live():
+    md = uhttp.MultiDict([('x', '1')])
+    md._get('x').append('2')
+    md._setdefault('y', []).append('3')
+    md._setdefault('y').append('4')
+    assert md == {'x': ['1', '2'], 'y': ['3', '4']}
+    assert md['x'] == '2'
+    assert md.pop('x') == '2'
+    assert md.pop('x') == '1'
+    assert 'x' not in md
+
+
+@pytest.mark.parametrize('data, status, value', [
+    (b'[' + b'1, ' * 20000 + b'-9223372036854775809]', 200, [1] * 20000 + [-9223372036854775809]),
+    (b'[' + b'1, ' * 20000 + b'2]', 200, [1] * 20000 + [2]),
+    (b'\xef\xbb\xbf[' + b'1, ' * 20000 + b'2]', 400, None),
+])
+async def test_json_large_body(app, data, status, value):
+    assert len(data) > uhttp._simd_threshold
+
+    @app.post('/')
+    def root(request):
+        assert request.json == value
+        return ''
+
+    async with async_asgi_testclient.TestClient(app) as client:
+        resp = await client.post('/', headers={'Content-Type': 'application/json'}, data=data)
+        assert resp.status_code == status
+
+
+@pytest.mark.parametrize('threshold', [
+    pytest.param(0, marks=pytest.mark.skipif(uhttp._simd_parser is None, reason='cysimdjson is not installed')),
+    float('inf'),
+])
+@pytest.mark.parametrize('data, status, value', [
+    (b'{"a": "b"}', 200, {'a': 'b'}),
+    (b'[18446744073709551617]', 200, [18446744073709551617]),
+    (b'[-9223372036854775809]', 200, [-9223372036854775809]),
+    (b'[NaN, 12345678901234567890]', 400, None),
+    (b'\xef\xbb\xbf[1]', 400, None),
+    (b'{"a', 400, None),
+])
+async def test_json_parsers(app, monkeypatch, threshold, data, status, value):
+    monkeypatch.setattr(uhttp, '_simd_threshold', threshold)
+
+    @app.post('/')
+    def root(request):
+        assert request.json == value
+        return ''
+
+    async with async_asgi_testclient.TestClient(app) as client:
+        resp = await client.post('/', headers={'Content-Type': 'application/json'}, data=data)
+        assert resp.status_code == status
+
+
+async def test_json_response_big_int(app):
+    @app.get('/')
+    def root(request):
+        return {'n': 2 ** 64}
+
+    async with async_asgi_testclient.TestClient(app) as client:
+        resp = await client.get('/')
+        assert resp.status_code == 200
+        assert json.loads(resp.content) == {'n': 2 ** 64}
+
+
+@pytest.mark.parametrize('http_version', ['1.1', '2', '3'])
+async def test_headers_from_asgi_scope(http_version):
+    headers = uhttp.Headers.from_asgi_scope({
+        'http_version': http_version,
+        'headers': [
+            (b'content-type', b'text/plain'),
+            (b'x-lower', b'a'),
+            (b'X-Kept', b'caf\xc3\xa9'),
+            (b'Accept', b'*/*'),
+        ],
+    })
+    assert set(headers) == {'content-type', 'x-lower', 'x-kept', 'accept'}
+    assert headers['Content-Type'] == 'text/plain'
+    assert headers.get('x-lower') == 'a'
+    assert headers.get('x-kept') == headers.get('X-Kept') == 'café'
+    assert headers['accept'] == '*/*'
+
+
+async def test_multidict_update_from_multidict():
+    md = uhttp.MultiDict({'s': 'abc', 'k': [[1, 2]], 'm': ['a', 'b']})
+    raw = uhttp.MultiDict()
+    raw._update(md)
+    assert raw == {'s': ['abc'], 'k': [[1, 2]], 'm': ['a', 'b']}
+    other = uhttp.MultiDict()
+    other.update(md)
+    assert other['k'] == [1, 2]
+    assert other == md
+    headers = uhttp.Headers()
+    headers._update(uhttp.MultiDict({'X-A': 'abc'}))
+    assert headers._get('x-a') == ['abc']
+
+
+async def test_response_content_type(app):
+    @app.get('/')
+    def root(request):
+        return 'Hello, world!'
+
+    @app.after
+    def check(request, response):
+        assert response.content_type == 'text/html; charset=utf-8'
+        response.content_type = 'text/plain'
+
+    async with async_asgi_testclient.TestClient(app) as client:
+        resp = await client.get('/')
+        assert resp.headers['content-type'] == 'text/plain'
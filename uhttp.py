@@ -1,131 +1,275 @@
 """µHTTP - ASGI micro framework"""
 
 import re
-import ijson
+import sys
 import json
+import orjson
 from http import HTTPStatus
 from http.cookies import SimpleCookie, CookieError
-from urllib.parse import parse_qsl, unquote
+from urllib.parse import parse_qsl
 from unicodedata import normalize
 from asyncio import to_thread
+from functools import cached_property
 from inspect import iscoroutinefunction
-import multipart
+from io import BytesIO
 from multipart.multipart import parse_options_header
+try:
+    import cysimdjson
+except ImportError:
+    cysimdjson = None
+
+
+_simd_parser = cysimdjson.JSONParser() if cysimdjson else None
+_simd_threshold = 50_000
+_long_number = re.compile(rb'\d{19}')
+_backref = re.compile(r'\\[1-9]|\(\?\(\d')
+_default_flags = re.compile('').flags
+_group_names = re.compile(
+    r'\\.|\[\^?\]?(?:\\.|[^\]])*\]|\(\?P<(\w+)>|\(\?P=(\w+)\)|\(\?\((\w+)\)'
+)
+_header_names = {
+    name: name.encode()
+    for name in (
+        'access-control-allow-origin', 'allow', 'cache-control',
+        'content-disposition', 'content-encoding', 'content-language',
+        'content-type', 'etag', 'expires', 'last-modified', 'location',
+        'set-cookie', 'vary', 'www-authenticate'
+    )
+}
+_status_phrases = {status.value: status.phrase for status in HTTPStatus}
+_status_bodies = {k: v.encode() for k, v in _status_phrases.items()}
+_missing = object()
+_common_headers = {
+    name: sys.intern(lowered)
+    for lowered in (
+        'accept', 'authorization', 'content-length', 'content-type',
+        'cookie', 'host', 'user-agent'
+    )
+    for name in (lowered, lowered.title())
+}
+_json_options = (
+    orjson.OPT_NON_STR_KEYS
+    | orjson.OPT_PASSTHROUGH_SUBCLASS
+    | orjson.OPT_SERIALIZE_NUMPY
+)
+_default_content_type = (b'content-type', b'text/html; charset=utf-8')
+
+
+def _mark_coroutine(func):
+    try:
+        func._uhttp_is_coro = iscoroutinefunction(func)
+    except AttributeError:  # e.g. bound methods
+        pass
+    return func
 
 
 async def asyncfy(func, /, *args, **kwargs):
-    if iscoroutinefunction(func):
+    is_coro = getattr(func, '_uhttp_is_coro', None)
+    if is_coro is None:
+        is_coro = iscoroutinefunction(func)
+    if is_coro:
         return await func(*args, **kwargs)
     else:
         return await to_thread(func, *args, **kwargs)
 
 
+def _reject_constant(name):
+    raise ValueError(f'Invalid JSON constant {name}')
+
+
+def _json_default(obj):
+    if isinstance(obj, MultiDict):
+        return dict(obj.items())
+    for base in (dict, list, str, int, float):
+        if isinstance(obj, base):
+            return base(obj)
+    raise TypeError
+
+
+def _prefix_groups(pattern, prefix):
+    def rename(match):
+        if name := match[1]:
+            return f'(?P<{prefix}{name}>'
+        elif name := match[2]:
+            return f'(?P={prefix}{name})'
+        elif name := match[3]:
+            return f'(?({prefix}{name})'
+        return match[0]  # escapes and character classes are left alone
+    return _group_names.sub(rename, pattern)
+
+
+def _lower(name):
+    return _common_headers.get(name) or name.lower()
+
+
+class _Values(list):  # more than one value stored under a MultiDict key
+    pass
+
+
+def _listed_args(args):
+    if args and isinstance(args[0], MultiDict):  # read lists, not the raw storage
+        return (args[0]._items(), *args[1:])
+    return args
+
+
+def _last(value):
+    return value[-1] if isinstance(value, _Values) else value
+
+
+def _listed(value):
+    return value if isinstance(value, _Values) else [value]
+
+
 class MultiDict(dict):
     def __init__(self, mapping=None):
+        super().__init__()
         if mapping is None:
-            super().__init__()
+            pass
         elif isinstance(mapping, MultiDict):
-            super().__init__({k: v[:] for k, v in mapping.itemslist()})
+            self._update(mapping._items())
         elif isinstance(mapping, dict):
-            super().__init__({
-                k: [v] if not isinstance(v, list) else v[:]
+            self._update({
+                k: [v] if not isinstance(v, list) else v
                 for k, v in mapping.items()
             })
         elif isinstance(mapping, (tuple, list)):
-            super().__init__()
             for key, value in mapping:
-                self._setdefault(key, []).append(value)
+                self[key] = value
         else:
             raise TypeError('Invalid mapping type')
 
+    def __eq__(self, other):
+        if isinstance(other, MultiDict):
+            other = dict(other._items())
+        return dict(self._items()) == other
+
+    def __ne__(self, other):
+        return not self == other
+
     def __getitem__(self, key):
-        return super().__getitem__(key)[-1]
+        return _last(super().__getitem__(key))
 
     def __setitem__(self, key, value):
-        super().setdefault(key, []).append(value)
+        current = super().get(key, _missing)
+        if current is _missing:
+            super().__setitem__(key, value)
+        elif isinstance(current, _Values):
+            current.append(value)
+        else:
+            super().__setitem__(key, _Values((current, value)))
 
     def _get(self, key, default=(None,)):
-        return super().get(key, list(default))
+        value = super().get(key, _missing)
+        if value is _missing:
+            return list(default)
+        elif not isinstance(value, _Values):
+            value = _Values((value,))
+            super().__setitem__(key, value)
+        return value
 
     def get(self, key, default=None):
-        return super().get(key, [default])[-1]
+        value = super().get(key, _missing)
+        return default if value is _missing else _last(value)
 
     def _items(self):
-        return super().items()
+        return ((k, _listed(v)) for k, v in super().items())
 
     def items(self):
-        return {k: v[-1] for k, v in super().items()}.items()
+        return ((k, _last(v)) for k, v in super().items())
 
     def _pop(self, key, default=(None,)):
-        return super().pop(key, list(default))
+        value = super().pop(key, _missing)
+        return list(default) if value is _missing else _listed(value)
 
     def pop(self, key, default=None):
-        values = super().get(key, [])
-        return values.pop() if len(values) > 1 else super().pop(key, default)
+        value = super().get(key, _missing)
+        if value is _missing:
+            return default
+        elif isinstance(value, _Values) and len(value) > 1:
+            return value.pop()
+        super().pop(key)
+        if isinstance(value, _Values):
+            return value[-1] if value else default
+        return value
 
     def _setdefault(self, key, default=(None,)):
-        return super().setdefault(key, list(default))
+        if key not in self:
+            super().__setitem__(key, _Values(default))
+        return self._get(key)
 
     def setdefault(self, key, default=None):
-        return super().setdefault(key, [default])[-1]
+        if key not in self:
+            self[key] = default
+        return self[key]
 
     def _values(self):
-        return super().values()
+        return (_listed(v) for v in super().values())
 
     def values(self):
-        return {k: v[-1] for k, v in super().items()}.values()
+        return (_last(v) for v in super().values())
 
     def _update(self, *args, **kwargs):
-        super().update(*args, **kwargs)
+        for key, values in dict(*_listed_args(args), **kwargs).items():
+            values = list(values)
+            super().__setitem__(
+                key, values[0] if len(values) == 1 else _Values(values)
+            )
 
     def update(self, *args, **kwargs):
-        new = {}
-        new.update(*args, **kwargs)
-        super().update(MultiDict(new))
+        self._update({
+            k: [v] if not isinstance(v, list) else v
+            for k, v in dict(*_listed_args(args), **kwargs).items()
+        })
 
 
 class Headers(MultiDict):
-    def __init__(self, mapping=None):
-        if mapping is None:
-            super().__init__()
-        elif isinstance(mapping, MultiDict):
-            super().__init__({k.lower(): v[:] for k, v in mapping.itemslist()})
-        elif isinstance(mapping, dict):
-            super().__init__({
-                k.lower(): [v] if not isinstance(v, list) else v[:]
-                for k, v in mapping.items()
-            })
-        elif isinstance(mapping, (tuple, list)):
-            super().__init__()
-            for key, value in mapping:
-                self._setdefault(key, []).append(value)
-        else:
-            raise TypeError('Invalid mapping type')
-
     def __getitem__(self, key):
-        return super().__getitem__(key.lower())[-1]
+        return super().__getitem__(_lower(key))
 
     def __setitem__(self, key, value):
-        super().setdefault(key.lower(), []).append(value)
+        super().__setitem__(_lower(key), value)
 
     def _get(self, key, default=(None,)):
-        return super().get(key.lower(), list(default))
+        return super()._get(_lower(key), default)
 
     def get(self, key, default=None):
-        return super().get(key.lower(), [default])[-1]
+        return super().get(_lower(key), default)
 
     def _pop(self, key, default=(None,)):
-        return super().pop(key.lower(), list(default))
+        return super()._pop(_lower(key), default)
 
     def pop(self, key, default=None):
-        values = super().get(key.lower(), [])
-        return values.pop() if len(values) > 1 else super().pop(key.lower(), default)
+        return super().pop(_lower(key), default)
 
     def _setdefault(self, key, default=(None,)):
-        return super().setdefault(key.lower(), list(default))
+        return super()._setdefault(_lower(key), default)
 
     def setdefault(self, key, default=None):
-        return super().setdefault(key.lower(), [default])[-1]
+        return super().setdefault(_lower(key), default)
+
+    @classmethod
+    def from_asgi_scope(cls, scope):
+        headers = cls()
+        lowercase = scope.get('http_version') in ('2', '3')  # lowercase by protocol, but check
+        for key, value in scope['headers']:
+            key = key.decode('ascii')
+            if not (lowercase and key.islower()):
+                key = key.lower()
+            MultiDict.__setitem__(
+                headers,
+                _common_headers.get(key, key),
+                value.decode('ascii') if value.isascii() else normalize('NFC', value.decode())
+            )
+        return headers
+
+    def _update(self, *args, **kwargs):
+        super()._update({
+            _lower(k): v for k, v in dict(*_listed_args(args), **kwargs).items()
+        })
+
+    def _encoded_items(self):
+        for key, values in super()._items():
+            yield _header_names.get(key) or key.encode(), values
 
 
 class Request:
@@ -146,13 +290,36 @@ class Request:
         self.method = method
         self.path = path
         self.params = params or {}
-        self.args = MultiDict(args)
-        self.headers = Headers(headers)
-        self.cookies = SimpleCookie(cookies)
+        self.headers = headers if isinstance(headers, Headers) else Headers(headers)
         self.body = body
-        self.json = json or {}
-        self.form = MultiDict(form)
         self.state = state or {}
+        self._args = args
+        self._cookies = cookies
+        self._json = json
+        self._form = form
+
+    @cached_property
+    def args(self):
+        return self._args if isinstance(self._args, MultiDict) else MultiDict(self._args)
+
+    @cached_property
+    def cookies(self):
+        if isinstance(self._cookies, SimpleCookie):
+            return self._cookies
+        cookies = SimpleCookie()
+        try:
+            cookies.load(self._cookies or '')
+        except CookieError:
+            raise Response(400)
+        return cookies
+
+    @cached_property
+    def json(self):
+        return self._json or {}
+
+    @cached_property
+    def form(self):
+        return self._form if isinstance(self._form, MultiDict) else MultiDict(self._form)
 
     def __repr__(self):
         return f'{self.method} {self.path}'
@@ -161,34 +328,42 @@ class Request:
 class Response(Exception):
     def __init__(self, status, *, headers=None, cookies=None, body=b''):
         self.status = status
-        try:
-            self.description = HTTPStatus(status).phrase
-        except ValueError:
-            self.description = ''
+        self.description = _status_phrases.get(status, '')
         super().__init__(self.description)
-        self.headers = MultiDict(headers)
-        self.headers.setdefault('content-type', 'text/html; charset=utf-8')
+        self.headers = Headers(headers)
         self.cookies = SimpleCookie(cookies)
         self.body = body
         if not self.body and status in range(400, 600):
             self.body = str(self).encode()
 
+    @property
+    def content_type(self):
+        return self.headers.get('content-type', _default_content_type[1].decode())
+
+    @content_type.setter
+    def content_type(self, value):
+        self.headers._update({'content-type': [value]})
+
     def __repr__(self):
         return f'{self.status} {self.description}'
 
     @classmethod
     def from_any(cls, any):
         if isinstance(any, int):
-            return cls(status=any, body=HTTPStatus(any).phrase.encode())
+            return cls(status=any, body=_status_bodies.get(any, b''))
         elif isinstance(any, str):
             return cls(status=200, body=any.encode())
         elif isinstance(any, bytes):
             return cls(status=200, body=any)
         elif isinstance(any, dict):
+            try:
+                body = orjson.dumps(any, default=_json_default, option=_json_options)
+            except orjson.JSONEncodeError:  # e.g. integers beyond 64 bits
+                body = json.dumps(any).encode()
             return cls(
                 status=200,
-                headers={'content-type': 'application/json'},
-                body=json.dumps(any).encode()
+                headers=[('content-type', 'application/json')],
+                body=body
             )
         elif isinstance(any, cls):
             return any
@@ -199,28 +374,178 @@ class Response(Exception):
 
 
 class Body:
-    def __init__(self, receive):
+    def __init__(self, receive, max_content=None):
         self.receive = receive
-        self.buffer = b''
+        self.max_content = max_content
+        self.buffer = bytearray()
+        self.size = 0
         self.finished = False
 
     async def read(self, n=-1):
         if n == 0:
             return b''
 
-        if not self.finished:
-            while len(self.buffer) == 0:
-                event = await self.receive()
-                self.buffer += event['body']
-                if not event.get('more_body'):
-                    self.finished = True
-        result = self.buffer
+        while not self.finished and (n < 0 or len(self.buffer) == 0):
+            event = await self.receive()
+            self.buffer.extend(event['body'])
+            self.size += len(event['body'])
+            if self.max_content is not None and self.size > self.max_content:
+                raise Response(413)
+            if not event.get('more_body'):
+                self.finished = True
         if n > 0:
-            self.buffer = result[n:]
-            result = result[:n]
+            result = bytes(self.buffer[:n])
+            del self.buffer[:n]
+        else:
+            result = bytes(self.buffer)
+            self.buffer.clear()
         return result
 
 
+class File:
+    def __init__(self, field_name, file_name):
+        self.field_name = field_name
+        self.file_name = file_name
+        self.file_object = BytesIO()
+        self.size = 0
+
+    def write(self, data):
+        self.size += self.file_object.write(data)
+
+    def __repr__(self):
+        return f'{self.file_name!r} ({self.size} bytes)'
+
+
+class Multipart:
+    def __init__(self, boundary, on_field, on_file):
+        self.delimiter = b'\r\n--' + boundary
+        self.on_field = on_field
+        self.on_file = on_file
+        self.buffer = bytearray(b'\r\n')
+        self.state = 'preamble'
+        self.field_name = None
+        self.part = None
+
+    def write(self, data):
+        buffer = self.buffer
+        buffer.extend(data)
+        while True:
+            if self.state in ('preamble', 'body'):
+                i = buffer.find(self.delimiter)
+                if i < 0:
+                    safe = len(buffer) - len(self.delimiter) + 1
+                    if safe > 0:
+                        if self.state == 'body':
+                            self.part.write(buffer[:safe])
+                        del buffer[:safe]
+                    return
+                if self.state == 'body':
+                    self.part.write(buffer[:i])
+                    self._finish_part()
+                del buffer[:i + len(self.delimiter)]
+                self.state = 'delimiter'
+            elif self.state == 'delimiter':
+                if buffer.startswith(b'--'):
+                    self.state = 'end'
+                    continue
+                i = buffer.find(b'\r\n')
+                if i < 0:
+                    return
+                del buffer[:i + 2]
+                self.state = 'headers'
+            elif self.state == 'headers':
+                i = 0 if buffer.startswith(b'\r\n') else buffer.find(b'\r\n\r\n')
+                if i < 0:
+                    return
+                self._start_part(bytes(buffer[:i]))
+                del buffer[:i + (2 if i == 0 else 4)]
+                self.state = 'body'
+            else:
+                buffer.clear()
+                return
+
+    def finalize(self):
+        if self.state != 'end':
+            raise ValueError('Truncated multipart body')
+
+    def _start_part(self, raw_headers):
+        disposition = b''
+        for line in raw_headers.split(b'\r\n'):
+            name, _, value = line.partition(b':')
+            if name.strip().lower() == b'content-disposition':
+                disposition = value.strip()
+        _, options = parse_options_header(disposition)
+        if b'name' not in options:
+            raise ValueError('Multipart part without a name')
+        self.field_name = options[b'name']
+        if b'filename' in options:
+            self.part = File(self.field_name, options[b'filename'])
+        else:
+            self.part = BytesIO()
+
+    def _finish_part(self):
+        if isinstance(self.part, File):
+            self.part.file_object.seek(0)
+            self.on_file(self.part)
+        else:
+            self.on_field(self.field_name, self.part.getvalue())
+        self.part = None
+
+
+async def _read_json(request, body, options):
+    request.body = await body.read()
+    if request.body.startswith(b'\xef\xbb\xbf'):  # orjson rejects a BOM, so must every path
+        raise Response(400)
+    if _long_number.search(request.body):  # orjson would round integers beyond 64 bits
+        try:
+            request.json = json.loads(request.body, parse_constant=_reject_constant)
+        except ValueError:
+            raise Response(400)
+        return
+    if _simd_parser and len(request.body) > _simd_threshold:
+        try:
+            request.json = _simd_parser.parse(request.body).export()
+            return
+        except Exception:  # let orjson decide, cysimdjson also raises RuntimeError
+            pass
+    try:
+        request.json = orjson.loads(request.body)
+    except ValueError:
+        raise Response(400)
+
+
+async def _read_urlencoded(request, body, options):
+    request.body = await body.read()
+    for key, value in parse_qsl(
+        request.body.decode(errors='replace'),
+        keep_blank_values=True
+    ):
+        request.form[key] = value
+
+
+async def _read_multipart(request, body, options):
+    form = request.form
+    def on_field(name, value):
+        form[name.decode()] = value.decode()
+    def on_file(file):
+        form[file.field_name.decode()] = file
+
+    try:
+        form_parser = Multipart(options[b'boundary'], on_field, on_file)
+        while chunk := await body.read(65536):
+            form_parser.write(chunk)
+        form_parser.finalize()
+    except (KeyError, ValueError):
+        raise Response(400)
+
+
+_body_readers = {
+    b'application/json': _read_json,
+    b'application/x-www-form-urlencoded': _read_urlencoded,
+    b'multipart/form-data': _read_multipart,
+}
+
+
 class App:
     def __init__(
         self,
@@ -238,6 +563,8 @@ class App:
         self._before = before or []
         self._after = after or []
         self._max_content = max_content
+        self._compiled = None
+        self._router = None
 
     def mount(self, app, prefix=''):
         self._startup += app._startup
@@ -248,23 +575,24 @@ class App:
         self._max_content = max(self._max_content, app._max_content)
 
     def startup(self, func):
-        self._startup.append(func)
+        self._startup.append(_mark_coroutine(func))
         return func
 
     def shutdown(self, func):
-        self._shutdown.append(func)
+        self._shutdown.append(_mark_coroutine(func))
         return func
 
     def before(self, func):
-        self._before.append(func)
+        self._before.append(_mark_coroutine(func))
         return func
 
     def after(self, func):
-        self._after.append(func)
+        self._after.append(_mark_coroutine(func))
         return func
 
     def route(self, path, methods=('GET',)):
         def decorator(func):
+            _mark_coroutine(func)
             self._routes.setdefault(path, {}).update({
                 method: func for method in methods
             })
@@ -298,6 +626,39 @@ class App:
     def patch(self, path):
         return self.route(path, methods=('PATCH',))
 
+    def _compile_routes(self):
+        self._compiled = {
+            f'_r{i}': (re.compile(path), methods)
+            for i, (path, methods) in enumerate(self._routes.items())
+        }
+        for methods in self._routes.values():
+            for func in methods.values():
+                _mark_coroutine(func)
+        self._router = None
+        if self._compiled and not any(
+            route.flags != _default_flags or _backref.search(route.pattern)
+            for route, _ in self._compiled.values()
+        ):
+            try:
+                self._router = re.compile('|'.join(
+                    f'(?P<{name}>{_prefix_groups(route.pattern, name + "_")})'
+                    for name, (route, _) in self._compiled.items()
+                ))
+            except re.error:
+                pass
+
+    def _match(self, path):
+        if self._compiled is None:
+            self._compile_routes()
+        if self._router is None:
+            for route, methods in self._compiled.values():
+                if matches := route.fullmatch(path):
+                    return matches.groupdict(), methods
+        elif matches := self._router.fullmatch(path):
+            name = matches.lastgroup
+            route, methods = self._compiled[name]
+            return {k: matches[f'{name}_{k}'] for k in route.groupindex}, methods
+
     async def __call__(self, scope, receive, send):
         if scope['type'] == 'lifespan':
             while True:
@@ -307,9 +668,7 @@ class App:
                     try:
                         for func in self._startup:
                             await asyncfy(func, scope['state'])
-                        self._routes = {
-                            re.compile(k): v for k, v in self._routes.items()
-                        }
+                        self._compile_routes()
                     except Exception as e:
                         await send({
                             'type': 'lifespan.startup.failed',
@@ -332,66 +691,43 @@ class App:
                     break
 
         elif scope['type'] == 'http':
+            try:
+                headers = Headers.from_asgi_scope(scope)
+            except UnicodeDecodeError:
+                headers = None
+
             request = Request(
                 method=scope['method'],
                 path=scope['path'],
-                args=parse_qsl(unquote(scope['query_string'])),
+                args=parse_qsl(
+                    scope['query_string'].decode(errors='replace'),
+                    keep_blank_values=True
+                ),
+                headers=headers,
+                cookies=headers.get('cookie') if headers is not None else None,
                 state=dict(scope.get('state', {})),
             )
 
-
             try:
-                try:
-                    request.headers = Headers([
-                        [k.decode('ascii'), normalize('NFC', v.decode())]
-                        for k, v in scope['headers']
-                    ])
-                except UnicodeDecodeError:
-                    raise Response(400)
-
-                try:
-                    request.cookies.load(request.headers.get('cookie', ''))
-                except CookieError:
+                if headers is None:
                     raise Response(400)
 
                 content_type, params = parse_options_header(request.headers.get('content-type', ''))
-                if content_type.split(b'+')[0] == b'application/json':
-                    try:
-                        async for json in ijson.items(Body(receive), ''):
-                            request.json = json
-                    except (UnicodeDecodeError, ijson.JSONError):
-                        raise Response(400)
-                elif content_type in (b'application/x-www-form-urlencoded', b'multipart/form-data'):
-                    request.form = form = MultiDict()
-                    def on_field(field):
-                        form[field.field_name.decode()] = field.value.decode()
-                    def on_file(file):
-                        form[file.field_name.decode()] = file
-
-                    form_parser = multipart.multipart.create_form_parser(request.headers, on_field, on_file)
-                    while True:
-                        event = await receive()
-                        form_parser.write(event['body'])
-                        if len(request.body) > self._max_content:
-                            raise HTTPException(413)
-                        if not event.get('more_body'):
-                            break
-                    form_parser.finalize()
+                if reader := _body_readers.get(content_type.partition(b'+')[0]):
+                    await reader(request, Body(receive, self._max_content), params)
 
                 for func in self._before:
                     if ret := await asyncfy(func, request):
                         raise Response.from_any(ret)
 
-                for route, methods in self._routes.items():
-                    if matches := route.fullmatch(request.path):
-                        request.params = matches.groupdict()
-                        if func := methods.get(request.method):
-                            ret = await asyncfy(func, request)
-                            response = Response.from_any(ret)
-                        else:
-                            response = Response(405)
-                            response.headers['allow'] = ', '.join(methods)
-                        break
+                if match := self._match(request.path):
+                    request.params, methods = match
+                    if func := methods.get(request.method):
+                        ret = await asyncfy(func, request)
+                        response = Response.from_any(ret)
+                    else:
+                        response = Response(405)
+                        response.headers['allow'] = ', '.join(methods)
                 else:
                     response = Response(404)
 
@@ -405,7 +741,7 @@ class App:
             except Response as late_response:
                 response = late_response
 
-            response.headers._update({'content-length': [len(response.body)]})
+            response.headers._pop('content-length')
             if response.cookies:
                 response.headers._update({
                     'set-cookie': [
@@ -414,13 +750,18 @@ class App:
                     ]
                 })
 
+            raw_headers = [
+                (k, b'%d' % v if type(v) is int else str(v).encode())
+                for k, l in response.headers._encoded_items() for v in l
+            ]
+            if 'content-type' not in response.headers:
+                raw_headers.append(_default_content_type)
+            raw_headers.append((b'content-length', b'%d' % len(response.body)))
+
             await send({
                 'type': 'http.response.start',
                 'status': response.status,
-                'headers': [
-                    [str(k).lower().encode(), str(v).encode()]
-                    for k, l in response.headers._items() for v in l
-                ]
+                'headers': raw_headers
             })
             await send({
                 'type': 'http.response.body',